@@ -1,10 +1,31 @@
-from openai import OpenAI
+from collections import deque
+from openai import AsyncOpenAI
+from queue import SimpleQueue
+import asyncio
+import httpx
 import json
+import math
+import orjson
+import os
+import re
+import signal
+import sys
+import threading
 import time
 
 import config
 
-client = OpenAI(api_key=config.OPENAI_API_KEY)
+# One pooled HTTP/2 connection set shared by every request, so the follow-up
+# and later turns reuse warm connections instead of new TLS handshakes
+http_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=32, max_connections=64, keepalive_expiry=60),
+)
+client = AsyncOpenAI(api_key=config.OPENAI_API_KEY, http_client=http_client)
+
+# Oldest turns are dropped once the history exceeds either limit
+MAX_HISTORY_MESSAGES = getattr(config, "MAX_HISTORY_MESSAGES", 64)
+MAX_HISTORY_TOKENS = getattr(config, "MAX_HISTORY_TOKENS", 8000)
 
 
 def fun_1():
@@ -93,177 +114,785 @@ fun_2_function = {
     },
 }
 
+# Tool dispatch table (name -> function) and the schemas sent to the model
+TOOLS = {"fun_2": fun_2}
+TOOL_SCHEMAS = [fun_2_function]
+
+# Built once at import time and reused by every request
+_SYSTEM_MSG = {"role": "system",
+               "content": "You are a helpful assistant. Add a short explanatory line after tool calls."}
+
+
+def _normalize_yield(yield_part):
+    """
+    Split a value yielded by a tool into what to display and whether to store it.
+
+    Args:
+        yield_part: Any value yielded by a tool function
+
+    Returns:
+        (display, store) tuple; plain values are displayed but not stored, and
+        dicts without a "display" field display their other fields instead
+    """
+    if not isinstance(yield_part, dict):
+        return yield_part, False
+
+    store = yield_part.get("store", False)
+    if "display" in yield_part:
+        return yield_part["display"], store
+
+    # Create display from other fields (excluding store)
+    display_data = {k: v for k, v in yield_part.items() if k != "store"}
+    return display_data or "", store
+
+
+# Characters that can change JSONObjectTracker's state; everything else is skipped
+_JSON_STRUCTURE = re.compile(r'[{}"\\]')
+# orjson turns integers beyond 64 bits into floats; such arguments go through json
+_LONG_DIGITS = re.compile(r"\d{19,}")
+
+
+def _loads_args(text: str):
+    """
+    Decode tool-call arguments with orjson, falling back to json when they may
+    hold integers too large for orjson to keep exact.
+
+    Args:
+        text (str): Arguments as the JSON text the model sent
+    """
+    if _LONG_DIGITS.search(text):
+        return json.loads(text)
+    return orjson.loads(text)
+
+
+def _dumps_tool_value(value) -> bytes:
+    """
+    Encode a stored tool value with orjson, falling back to json for what orjson
+    cannot encode as json.dumps did: integers beyond 64 bits raise, and NaN and
+    Infinity come out as null (so any null is re-checked with json).
+
+    Args:
+        value: Normalized tool output to store
+    """
+    try:
+        # Non-string keys are stringified, as json.dumps did
+        encoded = orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+        if b"null" not in encoded:
+            return encoded
+    except TypeError:
+        pass
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class JSONObjectTracker:
+    """
+    Watch streamed tool-call arguments and report when the top-level JSON
+    object closes, so the arguments are parsed once instead of on every delta.
+
+    Only braces outside of strings are counted; escaped quotes inside strings
+    are honoured. Pieces are scanned with a regex that jumps between structural
+    characters, so runs of ordinary text are skipped in C rather than walked
+    character by character in Python.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Forget any buffered arguments and start tracking a new object."""
+        self._parts = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._closed = False
+
+    def feed(self, piece: str):
+        """
+        Consume a newly streamed piece of the arguments.
+
+        Args:
+            piece (str): Text appended to the arguments since the last call
+        """
+        self._parts.append(piece)
+        if self._closed or not piece:
+            return
+
+        depth, in_string = self._depth, self._in_string
+        # A backslash that ended the previous piece escapes our first character
+        pos = 1 if self._escape else 0
+        escape = False
+        end = len(piece)
+        search = _JSON_STRUCTURE.search
+        while True:
+            match = search(piece, pos)
+            if match is None:
+                break
+            ch = match.group()
+            pos = match.end()
+            if in_string:
+                if ch == '"':
+                    in_string = False
+                elif ch == "\\":
+                    # Skip the escaped character, which may be in the next piece
+                    escape = pos == end
+                    pos += 1
+            elif ch == '"':
+                in_string = True
+            elif ch == "{":
+                depth += 1
+            elif ch == "}":
+                depth -= 1
+                if depth == 0:
+                    self._closed = True
+                    break
+        self._depth, self._in_string, self._escape = depth, in_string, escape
+
+    def complete(self) -> bool:
+        """Return True once the top-level object has been closed."""
+        return self._closed
+
+    @property
+    def text(self) -> str:
+        """The arguments received so far, as raw JSON text."""
+        return "".join(self._parts)
+
+    def value(self):
+        """Parse the buffered arguments; only call once complete() is True."""
+        return _loads_args(self.text)
+
+
+class DeltaBatcher:
+    """
+    Coalesce streamed text deltas into larger chunks before they are yielded.
+
+    The first batch is kept small so the first token still shows up immediately;
+    later batches grow by `growth` (at least one delta per flush) up to
+    `max_batch` deltas. A batch is also released once `max_delay` seconds have
+    passed since the previous one. That check only runs when a delta arrives,
+    so if the stream stalls, buffered text waits for the next delta or for
+    flush(); callers flush at the end of each phase and before tool output.
+    """
+
+    def __init__(self, min_batch: int = 1, max_batch: int = 50, growth: float = 3.0, max_delay: float = 0.02):
+        self.max_batch = max_batch
+        self.growth = growth
+        self.max_delay = max_delay
+        self._batch_size = min_batch
+        self._buf = []
+        self._last_flush = time.monotonic()
+
+    def add(self, delta: str):
+        """
+        Buffer a delta and return a joined batch if one is due, else None.
+
+        Args:
+            delta (str): Text delta received from the model
+        """
+        buf = self._buf
+        buf.append(delta)
+        if len(buf) >= self._batch_size or time.monotonic() - self._last_flush > self.max_delay:
+            return self.flush()
+        return None
+
+    def flush(self):
+        """Return whatever is buffered as one string (None if empty) and grow the batch size."""
+        if not self._buf:
+            return None
+        text = "".join(self._buf)
+        self._buf = []
+        self._last_flush = time.monotonic()
+        self._batch_size = min(self.max_batch, max(self._batch_size + 1, math.ceil(self._batch_size * self.growth)))
+        return text
+
+
+def estimate_tokens(message: dict) -> int:
+    """
+    Roughly estimate the tokens a history message costs (~4 characters per token).
+
+    Args:
+        message (dict): A chat message as stored in history
+    """
+    size = len(message.get("content") or "")
+    for tool_call in message.get("tool_calls") or ():
+        size += len(tool_call["function"]["arguments"])
+    return size // 4
+
+
+class Session:
+    """
+    One conversation: its history and a running token estimate for it.
+
+    ask_question only touches the Session it is given, so several
+    conversations can be served concurrently from one process.
+    """
+
+    __slots__ = ("history", "history_tokens")
+
+    def __init__(self):
+        self.history = deque(maxlen=MAX_HISTORY_MESSAGES)
+        self.history_tokens = 0
+
+    def add_to_history(self, message: dict):
+        """
+        Append a message to history, keeping the running token estimate in sync.
+
+        Args:
+            message (dict): A chat message to record
+        """
+        history = self.history
+        if len(history) == history.maxlen:
+            # deque drops the oldest message on append
+            self.history_tokens -= estimate_tokens(history[0])
+        history.append(message)
+        self.history_tokens += estimate_tokens(message)
+        # that drop can happen mid-turn, right before a follow-up is sent
+        self._drop_orphaned_tool_results()
+
+    def trim_history(self):
+        """
+        Evict the oldest messages until the history fits MAX_HISTORY_TOKENS.
+
+        Called at the start of a turn, so the latest message (the new question) is
+        always kept.
+        """
+        history = self.history
+        while len(history) > 1 and self.history_tokens > MAX_HISTORY_TOKENS:
+            self.history_tokens -= estimate_tokens(history.popleft())
+        self._drop_orphaned_tool_results()
+
+    def _drop_orphaned_tool_results(self):
+        """
+        Drop tool results left at the front after their tool call was evicted,
+        since the API rejects orphaned tool messages.
+        """
+        history = self.history
+        while len(history) > 1 and history[0]["role"] == "tool":
+            self.history_tokens -= estimate_tokens(history.popleft())
+
+
+def start_followup(session: Session):
+    """
+    Start the follow-up completion that summarizes tool results as a task,
+    so the request is in flight while the caller is still busy.
+
+    Args:
+        session (Session): Conversation whose history is sent
+
+    Returns:
+        asyncio.Task resolving to the follow-up stream
+    """
+    return asyncio.create_task(client.chat.completions.create(
+        model="gpt-4o-mini",
+        stream=True,
+        messages=[
+            _SYSTEM_MSG,
+            *session.history,
+        ],
+        temperature=1,
+    ))
+
 
-history = []
+async def discard_followup(followup_task: asyncio.Task):
+    """
+    Drop a follow-up started by start_followup that is no longer wanted,
+    closing its stream if the request already went through.
+
+    Args:
+        followup_task (asyncio.Task): Task returned by start_followup
+    """
+    if followup_task.cancel():
+        return
+    if not followup_task.cancelled() and followup_task.exception() is None:
+        await followup_task.result().close()
+
+
+# Max tool yields buffered ahead of a slow consumer
+TOOL_QUEUE_SIZE = 32
+# Put on the tool queue once the tool has no more yields
+_TOOL_DONE = object()
+# Idle tool workers kept around for reuse
+TOOL_IDLE_WORKERS = 8
+
+
+class _ToolWorkers:
+    """
+    Daemon threads that run tools, reused across tool calls instead of started
+    per call.
+
+    An idle worker takes the next call; when none is idle a new one is started,
+    so a tool blocked behind a slow consumer never makes another session's tool
+    wait for a thread. Workers are daemons so a tool still running never holds
+    up interpreter exit, and at most `max_idle` of them are kept once done.
+    """
+
+    def __init__(self, max_idle: int):
+        self.max_idle = max_idle
+        self._jobs = SimpleQueue()
+        self._idle = 0
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        """
+        Run fn(*args) on a worker thread.
+
+        Args:
+            fn: Function to run; exceptions it raises are not reported
+            *args: Arguments for fn
+        """
+        with self._lock:
+            start = not self._idle
+            if not start:
+                self._idle -= 1
+        self._jobs.put((fn, args))
+        if start:
+            threading.Thread(target=self._work, name="tool", daemon=True).start()
+
+    def _work(self):
+        jobs = self._jobs
+        while True:
+            fn, args = jobs.get()
+            try:
+                fn(*args)
+            except Exception:
+                pass
+            with self._lock:
+                if self._idle >= self.max_idle:
+                    return
+                self._idle += 1
+
+
+_TOOL_WORKERS = _ToolWorkers(TOOL_IDLE_WORKERS)
+
+
+def _produce_tool_output(tool, args: dict, queue: asyncio.Queue, loop,
+                         slots: threading.Semaphore, stop: threading.Event):
+    """
+    Run a tool in a worker thread, putting its normalized yields on a queue.
+
+    Each item is (display, encoded), where encoded is the display value already
+    JSON-encoded if it should be stored, else None. Items are handed to the
+    loop with call_soon_threadsafe; `slots` bounds them to TOOL_QUEUE_SIZE
+    unread items, blocking the tool while the consumer catches up. Ends with
+    _TOOL_DONE, or with the exception the tool raised.
+
+    Args:
+        tool: Tool function to run
+        args (dict): Decoded arguments for the tool
+        queue (asyncio.Queue): Queue read by run_tool_call
+        loop: Event loop the queue belongs to
+        slots (threading.Semaphore): Free places in the queue
+        stop (threading.Event): Set by the consumer when it stops reading
+    """
+    normalize_yield = _normalize_yield
+    dumps = _dumps_tool_value
+    put = queue.put_nowait
+    call_soon = loop.call_soon_threadsafe
+    try:
+        try:
+            for yield_part in tool(**args):
+                display_value, store = normalize_yield(yield_part)
+                encoded = dumps(display_value) if store else None
+                slots.acquire()
+                if stop.is_set():
+                    return
+                call_soon(put, (display_value, encoded))
+            last = _TOOL_DONE
+        except Exception as exc:
+            last = exc
+        if not stop.is_set():
+            call_soon(put, last)
+    except RuntimeError:
+        # The loop already closed; nobody is reading
+        pass
+
+
+async def run_tool_call(session: Session, tool_id: str, tool_name: str, raw_args: str, args: dict):
+    """
+    Record a complete tool call in history, run the tool, and record its result.
+
+    Args:
+        session (Session): Conversation the call belongs to
+        tool_id (str): Id linking the call to its result
+        tool_name (str): Name of the called tool
+        raw_args (str): Arguments as the JSON text the model sent
+        args (dict): The same arguments, decoded
+
+    Yields:
+        Display values of the tool's yields, in order
+    """
+    # Log the assistant's tool call message
+    session.add_to_history({
+        "role": "assistant",
+        "tool_calls": [
+            {
+                "id": tool_id,
+                "type": "function",
+                "function": {
+                    "name": tool_name,
+                    "arguments": raw_args
+                },
+            }
+        ],
+    })
+
+    tool = TOOLS.get(tool_name)
+    if tool is None:
+        # Still answer the call, since the API rejects a tool call without a result
+        session.add_to_history({
+            "role": "tool",
+            "tool_call_id": tool_id,
+            "name": tool_name,
+            "content": f"Unknown tool: {tool_name}",
+        })
+        return
+
+    # Run the tool in a worker thread behind a bounded queue, so it keeps
+    # computing while the consumer is busy with the previous yields
+    queue = asyncio.Queue()
+    slots = threading.Semaphore(TOOL_QUEUE_SIZE)
+    stop = threading.Event()
+    _TOOL_WORKERS.submit(_produce_tool_output, tool, args, queue, asyncio.get_running_loop(), slots, stop)
+
+    # Process each yield from the tool; stored values arrive pre-encoded and are
+    # appended to a JSON array as they come, so closing it is the only work left
+    tool_output_buf = bytearray(b"[")
+    tool_output_extend = tool_output_buf.extend
+    first = True
+    tool_output_str = None
+    try:
+        while True:
+            item = await queue.get()
+            slots.release()
+            if item is _TOOL_DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            display_value, encoded = item
+
+            if display_value:
+                yield display_value
+
+            # Store in output if requested
+            if encoded is not None:
+                if not first:
+                    tool_output_extend(b",")
+                tool_output_extend(encoded)
+                first = False
+
+        tool_output_extend(b"]")
+        tool_output_str = tool_output_buf.decode()
+    except Exception as exc:
+        tool_output_str = f"Tool failed: {exc}"
+        raise
+    finally:
+        # Unblock the worker if we stopped reading early
+        stop.set()
+        slots.release()
+
+        # Answer the call even if the tool failed or the reply was cut short,
+        # since the API rejects a tool call without a result
+        if tool_output_str is None:
+            tool_output_str = "Interrupted before the tool finished"
+        session.add_to_history({
+            "role": "tool",
+            "tool_call_id": tool_id,  # required link
+            "name": tool_name,
+            "content": tool_output_str,
+        })
+
+
+# A bare request to add two numbers, e.g. "5 + 10" or "add 5 and 10": all fun_2 needs
+_ADDITION_COMMAND = re.compile(
+    r"\s*(?:add|sum|calculate|compute|what is|what's)?\s*(-?\d+)\s*(?:\+|and|plus)\s*(-?\d+)\s*[?.!]?\s*",
+    re.IGNORECASE,
+)
+
+
+def looks_like_tool_command(ask: str) -> bool:
+    """
+    Guess whether the reply to a question will be just tool calls.
 
+    Deliberately narrow: only a bare addition, which the model answers by
+    calling fun_2 with no text of its own. Anything else streams as usual.
 
-def ask_question(ask: str):
+    Args:
+        ask (str): User's question or command
+    """
+    return _ADDITION_COMMAND.fullmatch(ask) is not None
+
+
+async def ask_question(session: Session, ask: str, expects_tool_only: bool = False):
     """
     Process user input, make API calls to OpenAI, and handle tool execution
 
     Args:
-        user_input: User's question or command
+        session: Conversation the question belongs to
+        ask: User's question or command
+        expects_tool_only: Whether the reply is expected to be just tool calls.
+            If so, the first request is made without streaming, since there is
+            no text to type out. Off by default, so replies stream; the demo
+            sets it from looks_like_tool_command.
 
     Yields:
         Chunks of the response as they are generated
     """
-    history.append({"role": "user", "content": ask})
+    session.add_to_history({"role": "user", "content": ask})
+    session.trim_history()
     # To visual the yields added to history
-    # print(history)
+    # print(session.history)
 
-    stream = client.chat.completions.create(
+    response = await client.chat.completions.create(
         model="gpt-5-mini-2025-08-07",
-        stream=True,
+        stream=not expects_tool_only,
         messages=[
-            {"role": "system",
-             "content": "You are a helpful assistant. Add a short explanatory line after tool calls."},
-            *history,
+            _SYSTEM_MSG,
+            *session.history,
         ],
-        tools=[fun_2_function],
+        tools=TOOL_SCHEMAS,
         tool_choice="auto",
         temperature=1
     )
 
-    collected = ""
-    partial_args = ""
-    tool_output = None
+    collected_parts = []
+    args_tracker = JSONObjectTracker()
     tool_name = None
-    tool_output_chunks = []
+    tool_id = None
+    text_batcher = DeltaBatcher()
+    followup_task = None
+    finish_reason = None
     try:
-        # Phase 1: Listen for text or tool calls
-        for chunk in stream:
-            if not (hasattr(chunk, "choices") and chunk.choices):
-                continue
-
-            choice = chunk.choices[0]
-            delta = getattr(choice.delta, "content", None)
-
-            # Handle normal model text
-            if delta:
-                yield delta
-                collected += delta
-
-            # Handle tool/function call stream
-            if hasattr(choice.delta, "tool_calls") and choice.delta.tool_calls:
-                for tool_call in choice.delta.tool_calls:
-                    # Extract tool call information
-                    tool_name = getattr(tool_call.function, "name", None) or "worlds"
-                    tool_id = getattr(tool_call, "id", None) or f"call_{int(time.time() * 1000)}"
-                    args_piece = getattr(tool_call.function, "arguments", "")
-                    if not args_piece:
-                        continue
-
-                    # Build up arguments as they stream in
-                    partial_args += args_piece
-
-                    try:
-                        # Try to parse the complete JSON arguments
-                        args = json.loads(partial_args)
-
-                        # Log the assistant's tool call message
-                        history.append({
-                            "role": "assistant",
-                            "tool_calls": [
-                                {
-                                    "id": tool_id,
-                                    "type": "function",
-                                    "function": {
-                                        "name": tool_name,
-                                        "arguments": json.dumps(args)
-                                    },
-                                }
-                            ],
-                        })
-
-                        # Process each yield from the tool
-                        for yield_part in fun_2(**args):
-                            if not isinstance(yield_part, dict):
-                                # Convert plain values to dicts with defaults
-                                yield_part = {
-                                    "display": yield_part,
-                                    "store": False
-                                }
-                            else:
-                                # Ensure dict has all required fields with defaults
-                                if "store" not in yield_part:
-                                    yield_part["store"] = False
-
-                                # Handle missing display field
-                                if "display" not in yield_part:
-                                    # Create display from other fields (excluding type and store)
-                                    display_data = {k: v for k, v in yield_part.items() if k not in ["store"]}
-
-                                    if display_data:
-                                        yield_part["display"] = display_data
-                                    else:
-                                        yield_part["display"] = ""
-
-                            display_value = yield_part["display"]
-
-                            if display_value:
-                                yield display_value
-
-                            # Store in output if requested
-                            if yield_part.get("store", False):
-                                # Store with type information for better processing later
-                                tool_output_chunks.append(display_value)
-
-                        tool_output_str = json.dumps(tool_output_chunks, ensure_ascii=False)
-
-                        history.append({
-                            "role": "tool",
-                            "tool_call_id": tool_id,  # required link
-                            "name": tool_name,
-                            "content": tool_output_str,
-                        })
-                        partial_args = ""  # reset
-                    except json.JSONDecodeError:
-                        # still receiving partial args
-                        pass
-
-        # Phase 2: Send tool output back for summary/continuation if needed
-        if tool_output_chunks and tool_name:
+        if expects_tool_only:
+            # Fast path: the whole reply arrives at once, so the arguments are
+            # parsed once without tracking partial JSON
+            choice = response.choices[0]
+            finish_reason = choice.finish_reason
+            message = choice.message
+
+            if message.content:
+                collected_parts.append(message.content)
+                yield message.content
+
+            for tool_call in message.tool_calls or ():
+                tool_name = tool_call.function.name
+                raw_args = tool_call.function.arguments
+                try:
+                    args = _loads_args(raw_args)
+                except json.JSONDecodeError:
+                    # Not valid JSON; drop this call
+                    continue
+                async for display_value in run_tool_call(session, tool_call.id, tool_name, raw_args, args):
+                    yield display_value
+        else:
+            # Phase 1: Listen for text or tool calls
+            async for chunk in response:
+                choices = chunk.choices
+                if not choices:
+                    continue
+
+                choice = choices[0]
+                choice_delta = choice.delta
+                delta = choice_delta.content
+
+                # Handle normal model text
+                if delta:
+                    collected_parts.append(delta)
+                    batch = text_batcher.add(delta)
+                    if batch:
+                        yield batch
+
+                # Handle tool/function call stream
+                tool_calls = choice_delta.tool_calls
+                if tool_calls:
+                    for tool_call in tool_calls:
+                        # Extract tool call information; the name only arrives on
+                        # the first delta of a call, so keep the last one seen
+                        function = tool_call.function
+                        if function is None:
+                            continue
+                        tool_name = function.name or tool_name
+                        # Resolve the id once per call; later deltas reuse it
+                        tool_id = tool_id or tool_call.id or f"call_{time.monotonic_ns()}"
+                        args_piece = function.arguments
+                        if not args_piece:
+                            continue
+
+                        # Build up arguments as they stream in
+                        args_tracker.feed(args_piece)
+                        if not args_tracker.complete():
+                            # still receiving partial args
+                            continue
+
+                        # The raw text is already valid JSON; keep it for the history echo
+                        # and only decode it for the local tool dispatch
+                        raw_args = args_tracker.text
+                        try:
+                            # Parse the complete JSON arguments exactly once
+                            args = args_tracker.value()
+                        except json.JSONDecodeError:
+                            # Balanced braces but not valid JSON; drop this call
+                            args_tracker.reset()
+                            tool_id = None
+                            continue
+                        args_tracker.reset()
+
+                        # Show any buffered text before the tool output
+                        pending = text_batcher.flush()
+                        if pending:
+                            yield pending
+
+                        async for display_value in run_tool_call(session, tool_id, tool_name, raw_args, args):
+                            yield display_value
+                        tool_id = None
+
+                if choice.finish_reason:
+                    finish_reason = choice.finish_reason
+                    # Every tool call of this reply has run by now; send the
+                    # follow-up while the remaining frames of the stream drain
+                    if finish_reason == "tool_calls" and tool_name and followup_task is None:
+                        followup_task = start_followup(session)
+
+            pending = text_batcher.flush()
+            if pending:
+                yield pending
+
+        # Phase 2: Send tool output back for summary/continuation, but only when
+        # the model stopped to wait for tool results; a reply that finished on
+        # its own already said everything
+        if finish_reason == "tool_calls" and tool_name:
 
             # Create a follow-up streaming completion with tool results
-            followup = client.chat.completions.create(
-                model="gpt-4o-mini",
-                stream=True,
-                messages=[
-                    {"role": "system",
-                     "content": "You are a helpful assistant. Add a short explanatory line after tool calls."},
-                    *history,
-                ],
-                temperature=1,
-            )
-
-            # Stream the follow-up response
-            for chunk in followup:
-                if hasattr(chunk, "choices") and chunk.choices:
-                    delta = getattr(chunk.choices[0].delta, "content", None)
-                    if delta:
-                        yield delta
-                        collected += delta
+            if followup_task is None:
+                followup_task = start_followup(session)
+            followup, followup_task = await followup_task, None
+
+            # Stream the follow-up response, starting a fresh batch ramp
+            text_batcher = DeltaBatcher()
+            async for chunk in followup:
+                choices = chunk.choices
+                if not choices:
+                    continue
+
+                delta = choices[0].delta.content
+                if delta:
+                    collected_parts.append(delta)
+                    batch = text_batcher.add(delta)
+                    if batch:
+                        yield batch
+
+            pending = text_batcher.flush()
+            if pending:
+                yield pending
 
-    except KeyboardInterrupt:
-        yield "\n[INTERRUPTED]\n"
     finally:
-        history.append({"role": "assistant", "content": collected})
+        # Also runs when Ctrl-C cancels the task, so the partial reply is kept
+        if followup_task is not None:
+            await discard_followup(followup_task)
+        session.add_to_history({"role": "assistant", "content": "".join(collected_parts)})
 
 
-if __name__ == "__main__":
+async def read_input(prompt: str) -> str:
+    """
+    Read a line from the terminal without blocking the event loop.
+
+    input() runs in a daemon thread rather than the default executor, which
+    asyncio.run joins on shutdown; a thread stuck waiting for input would
+    otherwise keep Ctrl-C at the prompt from exiting. That thread may still
+    hold stdin's lock when Ctrl-C ends the demo, so the entry point exits
+    with os._exit instead of running the interpreter teardown that waits on it.
+
+    Args:
+        prompt (str): Prompt written before reading
+
+    Raises:
+        EOFError: If stdin is closed
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def resolve(line, exc):
+        if future.done():
+            return
+        if exc is None:
+            future.set_result(line)
+        else:
+            future.set_exception(exc)
+
+    def read():
+        try:
+            line, exc = input(prompt), None
+        except Exception as e:
+            line, exc = None, e
+        try:
+            loop.call_soon_threadsafe(resolve, line, exc)
+        except RuntimeError:
+            # The loop already closed; nobody is waiting for this line
+            pass
+
+    threading.Thread(target=read, daemon=True).start()
+    return await future
+
+
+async def print_reply(session: Session, ask: str):
+    """
+    Print the reply to one question as it streams.
+
+    Args:
+        session (Session): Conversation the question belongs to
+        ask (str): User's question or request
+    """
+    # Chunks arrive already batched, so flushing per chunk is per batch
+    async for chunk in ask_question(session, ask, expects_tool_only=looks_like_tool_command(ask)):
+        print(chunk, end="", flush=True)
+
+
+async def main():
     """Main interactive loop to demonstrate the functionality"""
+    # Block-buffer the terminal so it is only written once per streamed batch
+    # rather than once per print call
+    sys.stdout = open(sys.stdout.fileno(), "w", buffering=1 << 14,
+                      encoding=sys.stdout.encoding, closefd=False)
     print("OpenAI Streaming Tool Calls Demo")
     print("Type 'exit' or 'quit' to end the session\n")
 
+    loop = asyncio.get_running_loop()
+    session = Session()
+
     while True:
-        user_input = input("You: ").strip()
+        user_input = (await read_input("You: ")).strip()
         if not user_input:
             continue
         if user_input.lower() in {"exit", "quit"}:
-            print("👋 Goodbye!")
+            print("👋 Goodbye!", flush=True)
             break
 
         print("Bot:", end=" ", flush=True)
-        for chunk in ask_question(user_input):
-            print(chunk, end="", flush=True)
+        # Ctrl-C during a reply cancels just that reply; at the prompt it still
+        # goes to asyncio.run and ends the session
+        reply = asyncio.ensure_future(print_reply(session, user_input))
+        on_sigint = signal.getsignal(signal.SIGINT)
+        try:
+            loop.add_signal_handler(signal.SIGINT, reply.cancel)
+        except NotImplementedError:
+            # No loop signal handlers (e.g. Windows); Ctrl-C ends the session
+            on_sigint = None
+        try:
+            await asyncio.wait([reply])
+        finally:
+            if on_sigint is not None:
+                loop.remove_signal_handler(signal.SIGINT)
+                signal.signal(signal.SIGINT, on_sigint)
+        if reply.cancelled():
+            print("\n[INTERRUPTED]")
+        else:
+            reply.result()
         print("\n")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        # asyncio.run cancels main() on Ctrl-C and re-raises it here
+        print("\n[INTERRUPTED]", flush=True)
+        # read_input's thread may still be blocked holding stdin
+        os._exit(130)